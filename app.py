@@ -4,17 +4,56 @@ import random
 import time
 import uuid
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Set, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import dash
-from dash import Dash, Input, Output, State, callback, dcc, html, no_update
+from dash import (
+    ClientsideFunction,
+    Dash,
+    Input,
+    Output,
+    State,
+    callback,
+    clientside_callback,
+    dcc,
+    html,
+    no_update,
+)
 import dash_cytoscape as cyto
+from flask.json.provider import DefaultJSONProvider
+import orjson
 
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+        indent = kwargs.pop("indent", None)
+        separators = kwargs.pop("separators", None)
+        # orjson only writes compact output or two-space indentation; anything else
+        # goes through the stdlib encoder.
+        if kwargs or indent not in (None, 2) or separators not in (None, (",", ":")):
+            return super().dumps(obj, sort_keys=sort_keys, indent=indent, separators=separators, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            # e.g. integers wider than 64 bits, which the stdlib encoder still accepts
+            return super().dumps(obj, sort_keys=sort_keys, indent=indent, separators=separators)
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 @dataclass(frozen=True)
 class NodeType:
     key: str
@@ -32,94 +71,37 @@ NODE_TYPES: List[NodeType] = [
     NodeType("zone", "Zones", "#f472b6"),
 ]
 
-TYPE_MAP: Dict[str, NodeType] = {node_type.key: node_type for node_type in NODE_TYPES}
+TYPE_LABEL: Dict[str, str] = {node_type.key: node_type.label for node_type in NODE_TYPES}
 
 
 def make_node(
-    node_id: str,
     label: str,
     type_key: str,
     parent: Optional[str] = None,
     position: Optional[Dict[str, float]] = None,
 ) -> Dict:
-    type_label = TYPE_MAP[type_key].label
-    combined_label = f"{label}\n{type_label}"
-    data = {
-        "id": node_id,
-        "label": combined_label,
-        "customLabel": label,
-        "type": type_key,
-        "typeLabel": type_label,
-        "color": TYPE_MAP[type_key].color,
-    }
+    node: Dict = {"label": label, "type": type_key}
     if parent:
-        data["parent"] = parent
-    node = {"data": data, "classes": type_key}
+        node["parent"] = parent
     if position:
         node["position"] = position
     return node
 
 
-def make_edge(source: str, target: str) -> Dict:
-    edge_id = f"edge-{source}-{target}"
-    return {"data": {"id": edge_id, "source": source, "target": target}}
+def make_edge(source: str, target: str) -> List[str]:
+    return [source, target]
 
 
-def build_children_map(elements: List[Dict]) -> Dict[str, List[str]]:
+def build_children_map(nodes: Dict[str, Dict]) -> Dict[str, List[str]]:
     children_map: Dict[str, List[str]] = {}
-    for element in elements:
-        data = element.get("data", {})
-        if "parent" in data:
-            children_map.setdefault(data["parent"], []).append(data["id"])
+    children_of = children_map.setdefault
+    for node_id, node in nodes.items():
+        parent = node.get("parent")
+        if parent is not None:
+            children_of(parent, []).append(node_id)
     return children_map
 
 
-def collect_descendants(root_id: str, children_map: Dict[str, List[str]]) -> Set[str]:
-    hidden: Set[str] = set()
-    queue = list(children_map.get(root_id, []))
-    while queue:
-        current = queue.pop(0)
-        hidden.add(current)
-        queue.extend(children_map.get(current, []))
-    return hidden
-
-
-def apply_visibility(elements: List[Dict], collapsed: Set[str]) -> List[Dict]:
-    children_map = build_children_map(elements)
-    hidden: Set[str] = set()
-    for collapsed_id in collapsed:
-        hidden.update(collect_descendants(collapsed_id, children_map))
-
-    visible_elements: List[Dict] = []
-    hidden_nodes = hidden
-    for element in elements:
-        data = element.get("data", {})
-        element_id = data.get("id")
-        source = data.get("source")
-        target = data.get("target")
-        is_edge = source is not None and target is not None
-        element_hidden = False
-        if is_edge:
-            element_hidden = source in hidden_nodes or target in hidden_nodes
-        else:
-            element_hidden = element_id in hidden_nodes
-        base_classes = element.get("classes", "")
-        if element_hidden:
-            element = {**element, "classes": f"hidden {base_classes}".strip()}
-        else:
-            element = {**element, "classes": base_classes}
-        visible_elements.append(element)
-    return visible_elements
-
-
-def tint_color(hex_color: str, alpha: float) -> str:
-    hex_color = hex_color.lstrip("#")
-    r = int(hex_color[0:2], 16)
-    g = int(hex_color[2:4], 16)
-    b = int(hex_color[4:6], 16)
-    return f"rgba({r}, {g}, {b}, {alpha})"
-
-
 def default_stylesheet() -> List[Dict]:
     stylesheet = [
         {
@@ -171,9 +153,9 @@ def default_stylesheet() -> List[Dict]:
         },
         {"selector": ".selected", "style": {"border-width": 3, "border-color": "#2563eb"}},
         {"selector": ".hidden", "style": {"display": "none"}},
+        {"selector": ".offscreen", "style": {"visibility": "hidden"}},
     ]
     for node_type in NODE_TYPES:
-        alpha = 0.1 if node_type.key == "building" else 0.14
         stylesheet.append(
             {
                 "selector": f'node[type = "{node_type.key}"]',
@@ -183,8 +165,11 @@ def default_stylesheet() -> List[Dict]:
     return stylesheet
 
 
-def initial_elements() -> List[Dict]:
-    return [make_node("root", "Main Building", "building", position={"x": 0, "y": 0})]
+DEFAULT_STYLESHEET: List[Dict] = default_stylesheet()
+
+
+def initial_nodes() -> Dict[str, Dict]:
+    return {"root": make_node("Main Building", "building", position={"x": 0, "y": 0})}
 
 
 def legend_items() -> List[html.Li]:
@@ -201,43 +186,51 @@ def legend_items() -> List[html.Li]:
     return items
 
 
-def build_hierarchy_view(elements: List[Dict]) -> html.Ul:
-    nodes = {el["data"]["id"]: el["data"] for el in elements if "source" not in el.get("data", {})}
-    children_map = build_children_map(elements)
-    root_nodes = [node_id for node_id, data in nodes.items() if "parent" not in data]
-
-    def render_list(node_ids: Iterable[str]) -> html.Ul:
-        items: List[html.Li] = []
-        for node_id in node_ids:
-            data = nodes.get(node_id, {})
-            label = data.get("customLabel", data.get("label", ""))
-            type_label = data.get("typeLabel", "")
-            children = children_map.get(node_id, [])
-            items.append(
-                html.Li(
-                    [
-                        html.Div(
-                            [
-                                html.Span(label, className="hierarchy-title"),
-                                html.Span(type_label, className="hierarchy-type"),
-                            ],
-                            className="hierarchy-row",
-                        ),
-                        render_list(children) if children else None,
-                    ],
-                    className="hierarchy-node",
-                )
-            )
-        return html.Ul(items, className="hierarchy-list")
+LEGEND_ITEMS: List[html.Li] = legend_items()
+
+
+def build_hierarchy_view(nodes: Dict[str, Dict], children_map: Dict[str, List[str]]) -> html.Ul:
+    root_nodes = [node_id for node_id, node in nodes.items() if "parent" not in node]
 
     if not root_nodes:
         return html.Ul([html.Li("No nodes yet.", className="hierarchy-empty")], className="hierarchy-list")
 
-    return render_list(root_nodes)
+    rendered: Dict[str, html.Li] = {}
+    stack: List[Tuple[str, bool]] = [(node_id, False) for node_id in reversed(root_nodes)]
+    while stack:
+        node_id, expanded = stack.pop()
+        children = children_map.get(node_id, [])
+        if not expanded:
+            stack.append((node_id, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+        node = nodes.get(node_id, {})
+        label = node.get("label", "")
+        type_label = TYPE_LABEL[node["type"]] if "type" in node else ""
+        child_items = [rendered[child] for child in children]
+        rendered[node_id] = html.Li(
+            [
+                html.Div(
+                    [
+                        html.Span(label, className="hierarchy-title"),
+                        html.Span(type_label, className="hierarchy-type"),
+                    ],
+                    className="hierarchy-row",
+                ),
+                html.Ul(child_items, className="hierarchy-list") if child_items else None,
+            ],
+            className="hierarchy-node",
+        )
+
+    return html.Ul([rendered[node_id] for node_id in root_nodes], className="hierarchy-list")
 
 
-app = Dash(__name__)
+cyto.load_extra_layouts()
+
+app = Dash(__name__, compress=True)
 app.title = "Building Systems Graph"
+server = app.server
+server.json = OrjsonProvider(server)
 
 app.layout = html.Div(
     className="app",
@@ -275,7 +268,7 @@ app.layout = html.Div(
                             ],
                         ),
                         html.H2("Node Types"),
-                        html.Ul(legend_items(), id="legend"),
+                        html.Ul(LEGEND_ITEMS, id="legend"),
                         html.Div(
                             className="panel",
                             children=[
@@ -309,9 +302,9 @@ app.layout = html.Div(
                     children=[
                         cyto.Cytoscape(
                             id="graph",
-                            elements=initial_elements(),
-                            layout={"name": "cose", "animate": True, "fit": True},
-                            stylesheet=default_stylesheet(),
+                            elements=[],
+                            layout={"name": "fcose", "animate": False, "fit": True},
+                            stylesheet=DEFAULT_STYLESHEET,
                             contextMenu=[
                                 {
                                     "id": "add-node",
@@ -347,10 +340,26 @@ app.layout = html.Div(
                 ),
             ],
         ),
-        dcc.Store(id="elements-store", data=initial_elements()),
-        dcc.Store(id="collapsed-store", data=[]),
+        dcc.Store(id="nodes-store", data=initial_nodes()),
+        dcc.Store(id="edges-store", data=[]),
+        dcc.Store(id="children-index", data=build_children_map(initial_nodes())),
+        dcc.Store(
+            id="building-ids",
+            data=[node_id for node_id, node in initial_nodes().items() if node["type"] == "building"],
+        ),
+        dcc.Store(id="neighbors", data={}),
+        dcc.Store(id="collapsed-store", data={}),
+        dcc.Store(id="structure-store", data=None),
+        dcc.Store(
+            id="node-types",
+            data={
+                node_type.key: {"label": node_type.label, "color": node_type.color}
+                for node_type in NODE_TYPES
+            },
+        ),
         dcc.Store(id="selected-store", data="root"),
-        dcc.Store(id="last-tap", data={"timestamp": 0, "node": None}),
+        dcc.Store(id="last-node-tap", data=0),
+        dcc.Store(id="last-node-id", data=None),
         dcc.Store(id="right-click-node", data=None),
         html.Div(id="selection-label", className="selection", style={"display": "none"}),
         html.Div(
@@ -405,31 +414,68 @@ app.layout = html.Div(
 )
 
 @callback(
-    Output("elements-store", "data"),
+    Output("nodes-store", "data"),
+    Output("edges-store", "data"),
     Output("selected-store", "data", allow_duplicate=True),
-    Output("last-tap", "data"),
+    Output("collapsed-store", "data"),
+    Output("last-node-tap", "data"),
+    Output("last-node-id", "data"),
+    Output("children-index", "data"),
+    Output("neighbors", "data"),
     Input("graph", "tapNodeData"),
+    Input("toggle-collapse", "n_clicks"),
     State("graph", "tapNode"),
-    State("elements-store", "data"),
+    State("connect-mode", "value"),
+    State("nodes-store", "data"),
+    State("edges-store", "data"),
     State("selected-store", "data"),
-    State("last-tap", "data"),
+    State("collapsed-store", "data"),
+    State("last-node-tap", "data"),
+    State("last-node-id", "data"),
+    State("children-index", "data"),
+    State("neighbors", "data"),
     prevent_initial_call=True,
 )
-def handle_node_tap(
+def handle_graph_input(
     tap_node_data: Optional[Dict],
+    _collapse_clicks: int,
     tap_node: Optional[Dict],
-    elements: List[Dict],
-    selected: str,
-    last_tap: Dict,
-) -> Tuple[List[Dict], str, Dict]:
+    connect_mode: List[str],
+    nodes: Dict[str, Dict],
+    edges: List[List[str]],
+    selected: Optional[str],
+    collapsed: Dict[str, bool],
+    last_timestamp: int,
+    last_node: Optional[str],
+    children_index: Dict[str, List[str]],
+    neighbors: Dict[str, List[str]],
+) -> Tuple[
+    Dict[str, Dict], List[List[str]], str, Dict[str, bool], int, Optional[str], Dict[str, List[str]], Dict[str, List[str]]
+]:
+    if dash.callback_context.triggered_id == "toggle-collapse":
+        if not selected:
+            return no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update
+        if selected in collapsed:
+            del collapsed[selected]
+        else:
+            collapsed[selected] = True
+        return no_update, no_update, no_update, collapsed, no_update, no_update, no_update, no_update
+
     if not tap_node_data:
-        return elements, selected, last_tap
+        return no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update
 
     tapped_id = tap_node_data.get("id")
-    timestamp = _now_ms()
-    last_node = last_tap.get("node")
-    last_timestamp = last_tap.get("timestamp", 0)
+    updated_edges = no_update
+    updated_neighbors = no_update
+    if "on" in connect_mode and selected and tapped_id and tapped_id != selected:
+        if tapped_id not in neighbors.get(selected, ()):
+            edges.append(make_edge(selected, tapped_id))
+            neighbors.setdefault(selected, []).append(tapped_id)
+            neighbors.setdefault(tapped_id, []).append(selected)
+            updated_edges = edges
+            updated_neighbors = neighbors
 
+    timestamp = _now_ms()
     if last_node == tapped_id and (timestamp - last_timestamp) < 650:
         position = None
         if tap_node:
@@ -440,50 +486,38 @@ def handle_node_tap(
                 "y": position.get("y", 0) + 40,
             }
         node_id = f"node-{uuid.uuid4().hex[:6]}"
-        new_node = make_node(node_id, "New Node", "sensors", parent=tapped_id, position=position)
-        return elements + [new_node], node_id, {"node": node_id, "timestamp": 0}
-
-    return elements, tapped_id, {"node": tapped_id, "timestamp": timestamp}
-
-
-@callback(
-    Output("elements-store", "data", allow_duplicate=True),
-    Input("connect-mode", "value"),
-    Input("graph", "tapNodeData"),
-    State("elements-store", "data"),
-    State("selected-store", "data"),
-    prevent_initial_call=True,
-)
-def connect_nodes(
-    connect_mode: List[str],
-    tap_node_data: Optional[Dict],
-    elements: List[Dict],
-    selected: str,
-) -> List[Dict]:
-    if not tap_node_data or "on" not in connect_mode:
-        return elements
-
-    target_id = tap_node_data.get("id")
-    if not target_id or target_id == selected:
-        return elements
-
-    existing_edges = {
-        (edge["data"]["source"], edge["data"]["target"])
-        for edge in elements
-        if edge.get("data", {}).get("source")
-    }
-    if (selected, target_id) in existing_edges or (target_id, selected) in existing_edges:
-        return elements
+        nodes[node_id] = make_node("New Node", "sensors", parent=tapped_id, position=position)
+        children_index.setdefault(tapped_id, []).append(node_id)
+        return (
+            nodes,
+            updated_edges,
+            node_id,
+            no_update,
+            0,
+            node_id,
+            children_index,
+            updated_neighbors,
+        )
 
-    return elements + [make_edge(selected, target_id)]
+    return (
+        no_update,
+        updated_edges,
+        no_update if tapped_id == selected else tapped_id,
+        no_update,
+        timestamp,
+        no_update if tapped_id == last_node else tapped_id,
+        no_update,
+        updated_neighbors,
+    )
 
 
 @callback(
     Output("hierarchy-tree", "children"),
-    Input("elements-store", "data"),
+    Input("nodes-store", "data"),
+    State("children-index", "data"),
 )
-def update_hierarchy(elements: List[Dict]) -> html.Ul:
-    return build_hierarchy_view(elements)
+def update_hierarchy(nodes: Dict[str, Dict], children_index: Dict[str, List[str]]) -> html.Ul:
+    return build_hierarchy_view(nodes, children_index)
 
 
 @callback(
@@ -493,15 +527,39 @@ def update_hierarchy(elements: List[Dict]) -> html.Ul:
     Output("edit-label-dialog", "style"),
     Output("label-input", "value"),
     Output("selected-store", "data", allow_duplicate=True),
-    Output("elements-store", "data", allow_duplicate=True),
+    Output("nodes-store", "data", allow_duplicate=True),
+    Output("edges-store", "data", allow_duplicate=True),
+    Output("children-index", "data", allow_duplicate=True),
+    Output("building-ids", "data", allow_duplicate=True),
+    Output("neighbors", "data", allow_duplicate=True),
     Input("graph", "contextMenuData"),
-    State("elements-store", "data"),
+    State("nodes-store", "data"),
+    State("edges-store", "data"),
+    State("children-index", "data"),
+    State("building-ids", "data"),
+    State("neighbors", "data"),
     prevent_initial_call=True,
 )
 def handle_context_action(
     context_data: Optional[Dict],
-    elements: List[Dict],
-) -> Tuple[Dict, str, Optional[str], Dict, str, str, List[Dict]]:
+    nodes: Dict[str, Dict],
+    edges: List[List[str]],
+    children_index: Dict[str, List[str]],
+    building_ids: List[str],
+    neighbors: Dict[str, List[str]],
+) -> Tuple[
+    Dict,
+    str,
+    Optional[str],
+    Dict,
+    str,
+    str,
+    Dict[str, Dict],
+    List[List[str]],
+    Dict[str, List[str]],
+    List[str],
+    Dict[str, List[str]],
+]:
     if not context_data:
         return (
             no_update,
@@ -511,6 +569,10 @@ def handle_context_action(
             no_update,
             no_update,
             no_update,
+            no_update,
+            no_update,
+            no_update,
+            no_update,
         )
 
     menu_item = context_data.get("menuItemId")
@@ -519,11 +581,12 @@ def handle_context_action(
     if menu_item == "add-node":
         new_id = f"node-{uuid.uuid4().hex[:6]}"
         new_node = make_node(
-            new_id,
             "New Node",
             "building",
             position={"x": random.randint(-100, 100), "y": random.randint(-100, 100)},
         )
+        nodes[new_id] = new_node
+        building_ids.append(new_id)
         return (
             {"display": "none"},
             no_update,
@@ -531,17 +594,26 @@ def handle_context_action(
             {"display": "none"},
             no_update,
             new_id,
-            elements + [new_node],
+            nodes,
+            no_update,
+            no_update,
+            building_ids,
+            no_update,
         )
 
     if menu_item == "delete-node" and node_id:
-        updated_elements = [
-            element
-            for element in elements
-            if element.get("data", {}).get("id") != node_id
-            and element.get("data", {}).get("source") != node_id
-            and element.get("data", {}).get("target") != node_id
-        ]
+        removed = nodes.pop(node_id, {})
+        siblings = children_index.get(removed.get("parent"))
+        if siblings and node_id in siblings:
+            siblings.remove(node_id)
+        children_index.pop(node_id, None)
+        was_building = node_id in building_ids
+        if was_building:
+            building_ids.remove(node_id)
+        adjacent = neighbors.pop(node_id, [])
+        for other in adjacent:
+            neighbors[other].remove(node_id)
+        updated_edges = [edge for edge in edges if node_id not in edge] if adjacent else no_update
         return (
             {"display": "none"},
             no_update,
@@ -549,17 +621,16 @@ def handle_context_action(
             {"display": "none"},
             no_update,
             no_update,
-            updated_elements,
+            nodes,
+            updated_edges,
+            children_index,
+            building_ids if was_building else no_update,
+            neighbors if adjacent else no_update,
         )
 
-    current_type = "building"
-    current_label = ""
-    for element in elements:
-        data = element.get("data", {})
-        if data.get("id") == node_id:
-            current_type = data.get("type", "building")
-            current_label = data.get("customLabel", data.get("label", ""))
-            break
+    node = nodes.get(node_id, {})
+    current_type = node.get("type", "building")
+    current_label = node.get("label", "")
 
     if menu_item == "edit-title":
         return (
@@ -570,6 +641,10 @@ def handle_context_action(
             current_label,
             node_id,
             no_update,
+            no_update,
+            no_update,
+            no_update,
+            no_update,
         )
 
     if menu_item == "change-type":
@@ -581,6 +656,10 @@ def handle_context_action(
             "",
             node_id,
             no_update,
+            no_update,
+            no_update,
+            no_update,
+            no_update,
         )
 
     return (
@@ -591,6 +670,10 @@ def handle_context_action(
         "",
         node_id,
         no_update,
+        no_update,
+        no_update,
+        no_update,
+        no_update,
     )
 
 
@@ -600,20 +683,15 @@ def handle_context_action(
     Output("right-click-node", "data", allow_duplicate=True),
     Input("show-type-menu", "n_clicks"),
     State("selected-store", "data"),
-    State("elements-store", "data"),
+    State("nodes-store", "data"),
     prevent_initial_call=True,
 )
 def show_type_dialog(
     _clicks: int,
     selected: str,
-    elements: List[Dict],
+    nodes: Dict[str, Dict],
 ) -> Tuple[Dict, str, Optional[str]]:
-    current_type = "building"
-    for element in elements:
-        data = element.get("data", {})
-        if data.get("id") == selected:
-            current_type = data.get("type", "building")
-            break
+    current_type = nodes.get(selected, {}).get("type", "building")
     return (
         {"display": "flex", "left": "50%", "top": "50%", "transform": "translate(-50%, -50%)"},
         current_type,
@@ -624,193 +702,85 @@ def show_type_dialog(
 @callback(
     Output("edit-label-dialog", "style", allow_duplicate=True),
     Output("label-input", "value", allow_duplicate=True),
-    Output("selected-store", "data", allow_duplicate=True),
     Input("edit-title-btn", "n_clicks"),
     State("selected-store", "data"),
-    State("elements-store", "data"),
+    State("nodes-store", "data"),
     prevent_initial_call=True,
 )
 def show_edit_dialog(
     _clicks: int,
     selected: str,
-    elements: List[Dict],
-) -> Tuple[Dict, str, str]:
-    current_label = ""
-    for element in elements:
-        data = element.get("data", {})
-        if data.get("id") == selected:
-            current_label = data.get("customLabel", data.get("label", ""))
-            break
-    return {"display": "flex"}, current_label, selected
+    nodes: Dict[str, Dict],
+) -> Tuple[Dict, str]:
+    current_label = nodes.get(selected, {}).get("label", "")
+    return {"display": "flex"}, current_label
 
 
-@callback(
-    Output("collapsed-store", "data"),
-    Input("toggle-collapse", "n_clicks"),
-    State("collapsed-store", "data"),
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="sync"),
+    Output("graph", "elements"),
+    Output("graph", "layout"),
+    Output("structure-store", "data"),
+    Input("nodes-store", "data"),
+    Input("edges-store", "data"),
+    Input("collapsed-store", "data"),
     State("selected-store", "data"),
+    State("structure-store", "data"),
+    State("node-types", "data"),
+)
+
+
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="fit"),
+    Input("fit-btn", "n_clicks"),
     prevent_initial_call=True,
 )
-def toggle_collapse(
-    _n_clicks: int,
-    collapsed: List[str],
-    selected: Optional[str],
-) -> List[str]:
-    if not selected:
-        return collapsed
-    collapsed_set = set(collapsed)
-    if selected in collapsed_set:
-        collapsed_set.remove(selected)
-    else:
-        collapsed_set.add(selected)
-    return list(collapsed_set)
 
 
-@callback(
-    Output("elements-store", "data", allow_duplicate=True),
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="relayout"),
+    Input("layout-btn", "n_clicks"),
+    prevent_initial_call=True,
+)
+
+
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="select"),
+    Output("selection-label", "children"),
+    Input("selected-store", "data"),
+    Input("nodes-store", "data"),
+    State("node-types", "data"),
+)
+
+
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="saveLabel"),
+    Output("nodes-store", "data", allow_duplicate=True),
     Output("edit-label-dialog", "style", allow_duplicate=True),
     Output("label-input", "value", allow_duplicate=True),
     Input("save-label", "n_clicks"),
     Input("cancel-label", "n_clicks"),
     State("label-input", "value"),
     State("selected-store", "data"),
-    State("elements-store", "data"),
+    State("nodes-store", "data"),
     prevent_initial_call=True,
 )
-def handle_label_edit(
-    save_clicks: int,
-    cancel_clicks: int,
-    new_label: str,
-    selected: Optional[str],
-    elements: List[Dict],
-) -> Tuple[List[Dict], Dict, str]:
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return elements, {"display": "none"}, ""
-
-    trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
-
-    if trigger_id == "cancel-label":
-        return elements, {"display": "none"}, ""
-
-    if trigger_id == "save-label" and new_label and selected:
-        updated: List[Dict] = []
-        for element in elements:
-            data = element.get("data", {})
-            if data.get("id") == selected:
-                type_label = data.get("typeLabel", "")
-                combined_label = f"{new_label}\n{type_label}"
-                updated_data = {**data, "label": combined_label, "customLabel": new_label}
-                updated.append({**element, "data": updated_data})
-            else:
-                updated.append(element)
-        return updated, {"display": "none"}, ""
-
-    return elements, {"display": "none"}, ""
 
 
-@callback(
-    Output("elements-store", "data", allow_duplicate=True),
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="applyType"),
+    Output("nodes-store", "data", allow_duplicate=True),
     Output("context-menu", "style", allow_duplicate=True),
+    Output("building-ids", "data"),
     Input("context-apply", "n_clicks"),
     Input("context-cancel", "n_clicks"),
     State("context-type-select", "value"),
     State("selected-store", "data"),
     State("right-click-node", "data"),
-    State("elements-store", "data"),
+    State("nodes-store", "data"),
+    State("building-ids", "data"),
     prevent_initial_call=True,
 )
-def handle_context_menu(
-    apply_clicks: int,
-    cancel_clicks: int,
-    type_key: str,
-    selected: Optional[str],
-    right_click_node: Optional[str],
-    elements: List[Dict],
-) -> Tuple[List[Dict], Dict]:
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return elements, {"display": "none"}
-
-    trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
-
-    if trigger_id == "context-cancel":
-        return elements, {"display": "none"}
-
-    if trigger_id == "context-apply":
-        # Use right-click node if available, otherwise use selected
-        target_node = right_click_node if right_click_node else selected
-        if not target_node:
-            return elements, {"display": "none"}
-        if type_key == "building":
-            existing_building = any(
-                element.get("data", {}).get("type") == "building"
-                and element.get("data", {}).get("id") != target_node
-                for element in elements
-            )
-            if existing_building:
-                return elements, {"display": "none"}
-        updated: List[Dict] = []
-        for element in elements:
-            data = element.get("data", {})
-            if data.get("id") == target_node:
-                custom_label = data.get("customLabel", data.get("label", ""))
-                type_label = TYPE_MAP[type_key].label
-                combined_label = f"{custom_label}\n{type_label}"
-                updated_data = {
-                    **data,
-                    "type": type_key,
-                    "typeLabel": type_label,
-                    "label": combined_label,
-                    "color": TYPE_MAP[type_key].color,
-                }
-                updated.append({**element, "data": updated_data, "classes": type_key})
-            else:
-                updated.append(element)
-        return updated, {"display": "none"}
-
-    return elements, {"display": "none"}
-
-
-@callback(
-    Output("graph", "elements"),
-    Output("graph", "layout"),
-    Output("selection-label", "children"),
-    Input("elements-store", "data"),
-    Input("collapsed-store", "data"),
-    Input("selected-store", "data"),
-    Input("fit-btn", "n_clicks"),
-    Input("layout-btn", "n_clicks"),
-)
-def sync_graph(
-    elements: List[Dict],
-    collapsed: List[str],
-    selected: Optional[str],
-    _fit_clicks: int,
-    _layout_clicks: int,
-) -> Tuple[List[Dict], Dict, str]:
-    processed = apply_visibility(elements, set(collapsed))
-    for element in processed:
-        data = element.get("data", {})
-        is_edge = "source" in data
-        if not is_edge:
-            type_key = data.get("type", "sensors")
-            existing = element.get("classes", "")
-            hidden_class = "hidden" if "hidden" in existing.split() else ""
-            classes = f"{hidden_class} {type_key}".strip()
-            if data.get("id") == selected:
-                classes = f"selected {classes}".strip()
-            element["classes"] = classes
-    selected_label = "None"
-    for element in processed:
-        data = element.get("data", {})
-        if selected and data.get("id") == selected:
-            type_label = data.get("typeLabel", "")
-            custom_label = data.get("customLabel", "")
-            selected_label = f"{type_label}: {custom_label}"
-            break
-    layout = {"name": "cose", "animate": True, "fit": True}
-    return processed, layout, selected_label
 
 
 if __name__ == "__main__":
@@ -0,0 +1,360 @@
+(function () {
+    function triggeredIds() {
+        const context = window.dash_clientside.callback_context;
+        return (context.triggered || []).map(function (trigger) {
+            return trigger.prop_id.split(".")[0];
+        });
+    }
+
+    function buildNodeIndex(nodes) {
+        const positions = new Map();
+        const ids = Object.keys(nodes);
+        ids.forEach(function (nodeId, position) {
+            positions.set(nodeId, position);
+        });
+        const children = ids.map(function () {
+            return [];
+        });
+        ids.forEach(function (nodeId, position) {
+            const parent = positions.get(nodes[nodeId].parent);
+            if (parent !== undefined) {
+                children[parent].push(position);
+            }
+        });
+        return { ids: ids, positions: positions, children: children };
+    }
+
+    function collapsedRoots(nodes, collapsed) {
+        const roots = [];
+        Object.keys(collapsed).forEach(function (collapsedId) {
+            let parent = nodes[collapsedId] ? nodes[collapsedId].parent : undefined;
+            while (parent !== undefined && !collapsed[parent]) {
+                parent = nodes[parent] ? nodes[parent].parent : undefined;
+            }
+            if (parent === undefined) {
+                roots.push(collapsedId);
+            }
+        });
+        return roots;
+    }
+
+    // Store data keeps its identity until a callback replaces it, so the index and
+    // per-root descendant lists are reused across syncs that only change collapse
+    // state.
+    const nodeIndexCache = new WeakMap();
+
+    function cachedNodeIndex(nodes) {
+        let index = nodeIndexCache.get(nodes);
+        if (!index) {
+            index = buildNodeIndex(nodes);
+            index.descendants = new Map();
+            nodeIndexCache.set(nodes, index);
+        }
+        return index;
+    }
+
+    function descendantsOf(index, root) {
+        let descendants = index.descendants.get(root);
+        if (!descendants) {
+            descendants = [];
+            const stack = index.children[root].slice();
+            while (stack.length) {
+                const current = stack.pop();
+                descendants.push(current);
+                stack.push.apply(stack, index.children[current]);
+            }
+            index.descendants.set(root, descendants);
+        }
+        return descendants;
+    }
+
+    // Node records and edge pairs also keep their identity between store writes, so
+    // an element whose classes did not change is returned as the same object.
+    const elementCache = new WeakMap();
+
+    function reuseElement(record, classes, build) {
+        const cached = elementCache.get(record);
+        if (cached && cached.classes === classes) {
+            return cached;
+        }
+        const element = build();
+        elementCache.set(record, element);
+        return element;
+    }
+
+    // Class strings for every type/flag combination are built once and shared.
+    const classCache = new Map();
+
+    function nodeClasses(type, selected, hidden) {
+        let table = classCache.get(type);
+        if (!table) {
+            table = new Array(4);
+            classCache.set(type, table);
+        }
+        const flags = (selected ? 2 : 0) | (hidden ? 1 : 0);
+        if (table[flags] === undefined) {
+            table[flags] = [selected ? "selected" : "", hidden ? "hidden" : "", type].filter(Boolean).join(" ");
+        }
+        return table[flags];
+    }
+
+    function toCytoNode(nodeId, node, classes, nodeTypes) {
+        const nodeType = nodeTypes[node.type];
+        // Stylesheets are JSON here and cannot concatenate data fields, so the
+        // two-line label is composed once per rebuilt element.
+        const data = {
+            id: nodeId,
+            label: `${node.label}\n${nodeType.label}`,
+            type: node.type,
+            color: nodeType.color,
+        };
+        if (node.parent !== undefined) {
+            data.parent = node.parent;
+        }
+        const element = { data: data, classes: classes };
+        if (node.position) {
+            element.position = node.position;
+        }
+        return element;
+    }
+
+    // Leaf nodes further than one viewport away from the visible extent, and edges
+    // whose whole span is that far away, are tagged "offscreen" on the live graph so
+    // Cytoscape skips them. Classes are only touched where the answer changed.
+    function cullOffscreen(cy) {
+        const extent = cy.extent();
+        const x1 = extent.x1 - extent.w;
+        const x2 = extent.x2 + extent.w;
+        const y1 = extent.y1 - extent.h;
+        const y2 = extent.y2 + extent.h;
+        cy.batch(function () {
+            cy.nodes().forEach(function (node) {
+                let outside = false;
+                if (node.isChildless()) {
+                    const position = node.position();
+                    outside = position.x < x1 || position.x > x2 || position.y < y1 || position.y > y2;
+                }
+                if (outside !== node.hasClass("offscreen")) {
+                    node.toggleClass("offscreen", outside);
+                }
+            });
+            cy.edges().forEach(function (edge) {
+                const source = edge.source().position();
+                const target = edge.target().position();
+                const outside =
+                    Math.max(source.x, target.x) < x1 ||
+                    Math.min(source.x, target.x) > x2 ||
+                    Math.max(source.y, target.y) < y1 ||
+                    Math.min(source.y, target.y) > y2;
+                if (outside !== edge.hasClass("offscreen")) {
+                    edge.toggleClass("offscreen", outside);
+                }
+            });
+        });
+    }
+
+    // At most one cull per animation frame, so a fast zoom-out is caught up before
+    // the next paint rather than after a debounce.
+    function scheduleCull(cy) {
+        if (cy.scratch("_cullPending")) {
+            return;
+        }
+        cy.scratch("_cullPending", true);
+        window.requestAnimationFrame(function () {
+            cy.scratch("_cullPending", false);
+            cullOffscreen(cy);
+        });
+    }
+
+    function attachListeners(cy) {
+        if (cy.scratch("_graphListeners")) {
+            return;
+        }
+        cy.on("viewport add layoutstop", function () {
+            scheduleCull(cy);
+        });
+        cy.scratch("_graphListeners", true);
+    }
+
+    // Every callback that touches the graph goes through here, so the listeners are
+    // attached by whichever one sees the Cytoscape instance first.
+    function liveGraph() {
+        const cy = window.cy;
+        if (cy) {
+            attachListeners(cy);
+        }
+        return cy;
+    }
+
+    function toCytoElements(nodes, edges, collapsed, selected, nodeTypes) {
+        const index = cachedNodeIndex(nodes);
+        const hidden = new Uint8Array(index.ids.length);
+        collapsedRoots(nodes, collapsed).forEach(function (collapsedId) {
+            const root = index.positions.get(collapsedId);
+            if (root !== undefined) {
+                descendantsOf(index, root).forEach(function (position) {
+                    hidden[position] = 1;
+                });
+            }
+        });
+
+        const elements = index.ids.map(function (nodeId, position) {
+            const node = nodes[nodeId];
+            const classes = nodeClasses(node.type, nodeId === selected, hidden[position] === 1);
+            return reuseElement(node, classes, function () {
+                return toCytoNode(nodeId, node, classes, nodeTypes);
+            });
+        });
+        edges.forEach(function (edge) {
+            const source = index.positions.get(edge[0]);
+            const target = index.positions.get(edge[1]);
+            const edgeHidden =
+                (source !== undefined && hidden[source]) || (target !== undefined && hidden[target]);
+            const classes = edgeHidden ? "hidden" : "";
+            elements.push(
+                reuseElement(edge, classes, function () {
+                    return {
+                        data: { id: `edge-${edge[0]}-${edge[1]}`, source: edge[0], target: edge[1] },
+                        classes: classes,
+                    };
+                })
+            );
+        });
+        return elements;
+    }
+
+    function structureSignature(nodes, edges) {
+        // 32-bit FNV-1a over node ids, parents and edge endpoints.
+        let hash = 0x811c9dc5;
+        function update(text) {
+            for (let i = 0; i < text.length; i++) {
+                hash ^= text.charCodeAt(i);
+                hash = Math.imul(hash, 0x01000193);
+            }
+        }
+        Object.keys(nodes).forEach(function (nodeId) {
+            update(`${nodeId}<${nodes[nodeId].parent || ""}\n`);
+        });
+        edges.forEach(function (edge) {
+            update(`${edge[0]}>${edge[1]}\n`);
+        });
+        return (hash >>> 0).toString(16);
+    }
+
+    // fcose settings scale with graph size: "proof" quality keeps the current
+    // positions as the starting point, while large graphs fall back to the
+    // spectral "draft" pass, which fcose only allows from random positions.
+    function forceLayout(nodeCount) {
+        const large = nodeCount >= 500;
+        const scale = Math.max(1, Math.log10(nodeCount + 1));
+        return {
+            name: "fcose",
+            quality: large ? "draft" : "proof",
+            randomize: large,
+            animate: false,
+            fit: true,
+            nodeSeparation: 75,
+            nodeRepulsion: Math.round(4500 * scale),
+            idealEdgeLength: Math.round(60 * scale),
+        };
+    }
+
+    // Edits copy the store and the one changed record so the caches above, which are
+    // keyed on object identity, never hand back an element built from stale data.
+    function replaceNode(nodes, nodeId, changes) {
+        const updated = Object.assign({}, nodes);
+        updated[nodeId] = Object.assign({}, nodes[nodeId], changes);
+        return updated;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        graph: {
+            sync: function (nodes, edges, collapsed, selected, previousStructure, nodeTypes) {
+                const cy = liveGraph();
+                const noUpdate = window.dash_clientside.no_update;
+                const elements = toCytoElements(nodes, edges, collapsed, selected, nodeTypes);
+                if (cy) {
+                    // Replacing an element's classes drops "offscreen", so re-cull once the
+                    // new elements have been applied.
+                    scheduleCull(cy);
+                }
+                const structure = structureSignature(nodes, edges);
+                if (structure !== previousStructure) {
+                    // The signature keeps the prop distinct when the node count is unchanged.
+                    const layout = Object.assign(forceLayout(Object.keys(nodes).length), { structure: structure });
+                    return [elements, layout, structure];
+                }
+                // Label, type and collapse edits keep every node where it is.
+                return [elements, noUpdate, noUpdate];
+            },
+
+            // The layout prop is diffed shallowly, so re-sending an identical layout
+            // would be ignored; the buttons act on the live graph instead.
+            fit: function (_fitClicks) {
+                const cy = liveGraph();
+                if (cy) {
+                    cy.fit();
+                }
+                return window.dash_clientside.no_update;
+            },
+
+            relayout: function (_layoutClicks) {
+                const cy = liveGraph();
+                if (cy) {
+                    cy.layout(forceLayout(cy.nodes().length)).run();
+                }
+                return window.dash_clientside.no_update;
+            },
+
+            select: function (selected, nodes, nodeTypes) {
+                const cy = liveGraph();
+                if (cy) {
+                    cy.batch(function () {
+                        cy.nodes(".selected").removeClass("selected");
+                        if (selected) {
+                            cy.getElementById(selected).addClass("selected");
+                        }
+                    });
+                }
+                const node = selected && nodes ? nodes[selected] : null;
+                if (!node) {
+                    return "None";
+                }
+                const nodeType = nodeTypes[node.type];
+                return `${nodeType ? nodeType.label : ""}: ${node.label}`;
+            },
+
+            saveLabel: function (_saveClicks, _cancelClicks, newLabel, selected, nodes) {
+                const hidden = { display: "none" };
+                const node = nodes[selected];
+                if (triggeredIds()[0] !== "save-label" || !newLabel || !node || node.label === newLabel) {
+                    return [window.dash_clientside.no_update, hidden, ""];
+                }
+                return [replaceNode(nodes, selected, { label: newLabel }), hidden, ""];
+            },
+
+            applyType: function (_applyClicks, _cancelClicks, typeKey, selected, rightClickNode, nodes, buildingIds) {
+                const noUpdate = window.dash_clientside.no_update;
+                const hidden = { display: "none" };
+                // Use right-click node if available, otherwise use selected
+                const target = rightClickNode || selected;
+                const node = nodes[target];
+                if (triggeredIds()[0] !== "context-apply" || !node || node.type === typeKey) {
+                    return [noUpdate, hidden, noUpdate];
+                }
+                let buildings = noUpdate;
+                if (typeKey === "building") {
+                    if (buildingIds.length) {
+                        return [noUpdate, hidden, noUpdate];
+                    }
+                    buildings = buildingIds.concat([target]);
+                } else if (node.type === "building") {
+                    buildings = buildingIds.filter(function (buildingId) {
+                        return buildingId !== target;
+                    });
+                }
+                return [replaceNode(nodes, target, { type: typeKey }), hidden, buildings];
+            },
+        },
+    });
+})();